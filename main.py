@@ -2,25 +2,32 @@ import asyncio
 import json
 import logging
 import os
-import smtplib
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, time
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 from dataclasses import dataclass
 from pathlib import Path
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
+from time import monotonic
+from email.message import EmailMessage
 
+import numpy as np
+import pandas as pd
 import yfinance as yf
 from fastapi import FastAPI, HTTPException
 from fastapi.responses import JSONResponse
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from apscheduler.triggers.combining import OrTrigger
 from apscheduler.triggers.cron import CronTrigger
 from dotenv import load_dotenv
 
+from smtp_pool import SMTPPool
+
 load_dotenv(dotenv_path=".env")
 
 
-@dataclass
+@dataclass(slots=True)
 class StockConfig:
     symbol: str
     company_name: str
@@ -29,7 +36,7 @@ class StockConfig:
     security_cover_threshold: float
 
 
-@dataclass
+@dataclass(slots=True)
 class SenderConfig:
     from_email: str
     from_name: str
@@ -40,7 +47,7 @@ class SenderConfig:
     use_tls: bool = True
 
 
-@dataclass
+@dataclass(slots=True)
 class RecipientConfig:
     email: str
     subscribed_symbols: List[str]
@@ -65,7 +72,48 @@ class RecipientConfig:
 class ConfigManager:
     def __init__(self, config_path: str = "config.json"):
         self.config_path = Path(config_path)
-        self.config = self._load_config()
+        self._reload()
+    
+    def _reload(self):
+        config = self._load_config()
+        # Stat after loading: a missing file is recreated with defaults by _load_config
+        mtime = self.config_path.stat().st_mtime
+        
+        # Parse into dataclasses once per file version; getters hand out these objects.
+        # Everything is built before anything is assigned, so a bad file leaves the previous configuration intact
+        stocks = [StockConfig(**stock) for stock in config.get("stocks", [])]
+        recipients = [RecipientConfig(**recipient) for recipient in config.get("recipients", [])]
+        sender = self._build_sender_config(config)
+        schedule_times = config["schedule"]["daily_reports"]
+        timezone = config["schedule"]["timezone"]
+        currency_symbol = config.get("currency_symbol", "₹")
+        
+        self._stocks = stocks
+        self._stock_by_symbol = {stock.symbol: stock for stock in stocks}
+        self._recipients = recipients
+        self._sender = sender
+        self._schedule_times = schedule_times
+        self._timezone = timezone
+        self._currency_symbol = currency_symbol
+        self.config = config
+        self._mtime = mtime
+    
+    def reload_if_changed(self) -> bool:
+        try:
+            mtime = os.stat(self.config_path).st_mtime
+        except OSError:
+            return False
+        if mtime == self._mtime:
+            return False
+        try:
+            self._reload()
+            logging.info(f"Reloaded configuration from {self.config_path}")
+            return True
+        except Exception as e:
+            # Don't retry the same broken file on every call
+            self._mtime = mtime
+            logging.error(f"Failed to reload {self.config_path}, keeping previous configuration: {e}")
+            return False
     
     def _load_config(self) -> Dict:
         try:
@@ -111,10 +159,17 @@ class ConfigManager:
             json.dump(default_config, f, indent=4)
     
     def get_stocks(self) -> List[StockConfig]:
-        return [StockConfig(**stock) for stock in self.config.get("stocks", [])]
+        return self._stocks
     
-    def get_sender_config(self) -> SenderConfig:
-        sender_data = self.config["email_sender"].copy()
+    def get_stocks_by_symbol(self) -> Dict[str, StockConfig]:
+        return self._stock_by_symbol
+    
+    def get_stock(self, symbol: str) -> Optional[StockConfig]:
+        return self.get_stocks_by_symbol().get(symbol)
+    
+    @staticmethod
+    def _build_sender_config(config: Dict) -> SenderConfig:
+        sender_data = config["email_sender"].copy()
         
         if 'smtp_password' not in sender_data or not sender_data['smtp_password']:
             env_password = os.getenv('SMTP_PASSWORD')
@@ -122,52 +177,141 @@ class ConfigManager:
                 sender_data['smtp_password'] = env_password
         
         return SenderConfig(**sender_data)
+    
+    def get_sender_config(self) -> SenderConfig:
+        return self._sender
 
     def get_recipients(self) -> List[RecipientConfig]:
-        return [RecipientConfig(**recipient) for recipient in self.config.get("recipients", [])]
+        return self._recipients
     
     def get_schedule_times(self) -> List[str]:
-        return self.config["schedule"]["daily_reports"]
+        return self._schedule_times
 
     def get_timezone(self) -> str:
-        return self.config["schedule"]["timezone"]
+        return self._timezone
 
     def get_currency_symbol(self) -> str:
-        return self.config.get("currency_symbol", "₹")
+        return self._currency_symbol
 
 
 class StockPriceMonitor:
+    # During market hours the last 5d/1d row is today's live bar, so daily history can't be held longer than intraday
+    HISTORY_TTL = 60.0
+    INFO_TTL = 6 * 60 * 60.0
+    MAX_CONCURRENT_FETCHES = 8
+    SHARED_FETCH_TTL = 30.0
+    # yf.download collects results in module-level globals that every call resets, so no two downloads may overlap
+    _download_lock = threading.Lock()
+    
     def __init__(self):
         self.cache = {}
         self.last_update = {}
+        # yfinance is synchronous: run it on a bounded pool and cap in-flight requests to stay under Yahoo rate limits
+        self._executor = ThreadPoolExecutor(max_workers=self.MAX_CONCURRENT_FETCHES, thread_name_prefix="yfinance")
+        self._fetch_semaphore = asyncio.Semaphore(self.MAX_CONCURRENT_FETCHES)
+        self._ticker_cache: Dict[str, yf.Ticker] = {}
+        # (symbol, period, interval) -> (fetched_at, frame)
+        self._history_cache: Dict[Tuple[str, str, str], Tuple[float, pd.DataFrame]] = {}
+        self._info_cache: Dict[str, Tuple[float, Dict]] = {}
+        # (fetched_at, stock_configs, include_info, result) of the last watchlist fetch, shared by scheduled jobs
+        self._last_fetch: Optional[Tuple[float, Tuple[StockConfig, ...], bool, Dict[str, Dict]]] = None
+        self._fetch_lock = asyncio.Lock()
+    
+    def _get_ticker(self, symbol: str) -> yf.Ticker:
+        ticker = self._ticker_cache.get(symbol)
+        if ticker is None:
+            ticker = self._ticker_cache[symbol] = yf.Ticker(symbol)
+        return ticker
+    
+    def get_info(self, symbol: str, ttl: float = INFO_TTL) -> Dict:
+        cached = self._info_cache.get(symbol)
+        if cached and monotonic() - cached[0] < ttl:
+            return cached[1]
+        info = self._get_ticker(symbol).info
+        self._info_cache[symbol] = (monotonic(), info)
+        return info
     
-    async def get_stock_data(self, stock_config: StockConfig) -> Dict:
+    def _get_history(self, symbols: List[str], period: str, interval: str, ttl: float) -> Dict[str, pd.DataFrame]:
+        now = monotonic()
+        frames = {}
+        stale = []
+        for symbol in symbols:
+            cached = self._history_cache.get((symbol, period, interval))
+            if cached and now - cached[0] < ttl:
+                frames[symbol] = cached[1]
+            else:
+                stale.append(symbol)
+        
+        if stale:
+            with self._download_lock:
+                df = yf.download(tickers=" ".join(stale), period=period, interval=interval, group_by='ticker', threads=True, progress=False)
+            for symbol in stale:
+                frame = self._slice_symbol(df, symbol, stale)
+                # Don't pin a failed download for the whole TTL
+                if not frame.empty:
+                    self._history_cache[(symbol, period, interval)] = (now, frame)
+                frames[symbol] = frame
+        return frames
+    
+    def fetch_batch(self, symbols: List[str]) -> Dict[str, Tuple[pd.DataFrame, pd.DataFrame]]:
+        # One daily and one intraday request for the stale part of the watchlist instead of per-ticker history calls
+        daily = self._get_history(symbols, "5d", "1d", self.HISTORY_TTL)
+        intraday = self._get_history(symbols, "1d", "1m", self.HISTORY_TTL)
+        return {symbol: (daily[symbol], intraday[symbol]) for symbol in symbols}
+    
+    async def _run_fetch(self, func, *args):
+        async with self._fetch_semaphore:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+    
+    @staticmethod
+    def _slice_symbol(df: pd.DataFrame, symbol: str, symbols: List[str]) -> pd.DataFrame:
+        if df is None or df.empty:
+            return pd.DataFrame()
+        if isinstance(df.columns, pd.MultiIndex):
+            # yfinance upper-cases tickers in the result columns
+            key = symbol.upper()
+            if key not in df.columns.get_level_values(0):
+                return pd.DataFrame()
+            # Batched frames share one date index, so drop rows this symbol has no bar for
+            return df.xs(key, level=0, axis=1).dropna(how='all')
+        # Older yfinance releases return flat columns for a single ticker
+        return df if len(symbols) == 1 else pd.DataFrame()
+    
+    async def get_stock_data(self, stock_config: StockConfig, history: Optional[Tuple[pd.DataFrame, pd.DataFrame]] = None, include_info: bool = True) -> Dict:
         symbol = stock_config.symbol
         try:
-            ticker = yf.Ticker(symbol)
-            info = ticker.info
+            if history is None:
+                batch = await self._run_fetch(self.fetch_batch, [symbol])
+                history = batch[symbol]
+            hist_5d, hist_1d = history
+            
+            # ticker.info is a slow endpoint; callers that only need prices and cover can skip it
+            info = await self._run_fetch(self.get_info, symbol) if include_info else {}
             
-            # Get 5-day history to ensure we have yesterday's data
-            hist_5d = ticker.history(period="5d", interval="1d")
-            hist_1d = ticker.history(period="1d", interval="1m")
+            # Only a few trailing scalars are needed, so index plain arrays rather than going through .iloc
+            daily_closes = hist_5d['Close'].to_numpy() if not hist_5d.empty else np.empty(0)
             
             # Current price logic
             if hist_1d.empty:
+                if include_info:
+                    # The price comes from info here, and a cached snapshot can be hours old
+                    info = await self._run_fetch(self.get_info, symbol, self.HISTORY_TTL)
                 current_price = info.get('currentPrice') or info.get('previousClose')
+                current_volume = info.get('volume', 0)
+                # Without info (threat checks) there is no live price; fail so the caller falls back to the logged cached data
                 if not current_price:
                     raise ValueError(f"No data available for {symbol}")
-                current_volume = info.get('volume', 0)
             else:
-                current_price = hist_1d['Close'].iloc[-1]
-                current_volume = int(hist_1d['Volume'].iloc[-1])
+                current_price = hist_1d['Close'].to_numpy()[-1]
+                current_volume = int(hist_1d['Volume'].to_numpy()[-1])
 
             # Yesterday's closing price and previous close
             prev_close = info.get('previousClose', current_price)
             yesterday_close = prev_close  # Default fallback
             
-            if not hist_5d.empty and len(hist_5d) >= 2:
-                yesterday_close = hist_5d['Close'].iloc[-2]  # Yesterday's close
-                prev_close = hist_5d['Close'].iloc[-1]  # Last trading day close
+            if len(daily_closes) >= 2:
+                yesterday_close = daily_closes[-2]  # Yesterday's close
+                prev_close = daily_closes[-1]  # Last trading day close
             
             # Current day change (vs previous close)
             current_change = current_price - prev_close
@@ -176,8 +320,8 @@ class StockPriceMonitor:
             # Yesterday's change (vs day before yesterday)
             yesterday_change = 0.0
             yesterday_change_percent = 0.0
-            if not hist_5d.empty and len(hist_5d) >= 3:
-                day_before_yesterday = hist_5d['Close'].iloc[-3]
+            if len(daily_closes) >= 3:
+                day_before_yesterday = daily_closes[-3]
                 yesterday_change = yesterday_close - day_before_yesterday
                 yesterday_change_percent = (yesterday_change / day_before_yesterday) * 100 if day_before_yesterday else 0
 
@@ -214,39 +358,116 @@ class StockPriceMonitor:
                 return self.cache[symbol]
             raise
     
-    async def check_multiple_stocks(self, stock_configs: List[StockConfig]) -> Dict[str, Dict]:
-        tasks = [self.get_stock_data(sc) for sc in stock_configs]
-        results = await asyncio.gather(*tasks, return_exceptions=True)
+    async def fetch_all_cached(self, stock_configs: List[StockConfig], include_info: bool = True, ttl: float = SHARED_FETCH_TTL) -> Dict[str, Dict]:
+        configs = tuple(stock_configs)
+        async with self._fetch_lock:
+            if self._last_fetch is not None:
+                fetched_at, cached_configs, had_info, result = self._last_fetch
+                # A result fetched with info also serves callers that don't need it
+                if cached_configs == configs and (had_info or not include_info) and monotonic() - fetched_at < ttl:
+                    return result
+            
+            result = await self.check_multiple_stocks(stock_configs, include_info)
+            self._last_fetch = (monotonic(), configs, include_info, result)
+            return result
+    
+    async def check_multiple_stocks(self, stock_configs: List[StockConfig], include_info: bool = True) -> Dict[str, Dict]:
+        symbols = [sc.symbol for sc in stock_configs]
+        try:
+            batch = await self._run_fetch(self.fetch_batch, symbols)
+        except Exception as e:
+            logging.error(f"Batch history download failed for {', '.join(symbols)}: {e}")
+            batch = {}
+        
+        empty_history = (pd.DataFrame(), pd.DataFrame())
+        tasks = {
+            asyncio.create_task(self.get_stock_data(sc, batch.get(sc.symbol, empty_history), include_info)): sc.symbol
+            for sc in stock_configs
+        }
         
         stock_data_map = {}
-        for stock_config_item, result in zip(stock_configs, results):
-            symbol = stock_config_item.symbol
-            if isinstance(result, Exception):
-                logging.error(f"Failed to fetch {symbol}: {result}")
+        # Handle results as they finish; watchlist order is restored below
+        async for task in asyncio.as_completed(tasks):
+            symbol = tasks[task]
+            error = task.exception()
+            if error is not None:
+                logging.error(f"Failed to fetch {symbol}: {error}")
                 if symbol in self.cache:
                     logging.warning(f"Using cached data for {symbol} in multi-check due to error.")
                     stock_data_map[symbol] = self.cache[symbol]
                 continue
-            stock_data_map[symbol] = result
+            stock_data_map[symbol] = task.result()
         
+        # Keep watchlist order so reports list stocks consistently
+        stock_data_map = {symbol: stock_data_map[symbol] for symbol in symbols if symbol in stock_data_map}
         return stock_data_map
 
 
+STOCK_SECTION_TEMPLATE = """
+            <h3 style="{header_style}">{header_text}</h3>
+            <table style="border-collapse: collapse; width: 100%; font-family: Arial, sans-serif; margin-bottom: 20px;">
+                <tr style="background-color: #f2f2f2;"><td colspan="2" style="border: 1px solid #dddddd; text-align: center; padding: 8px; font-weight: bold; font-size: 14px;">📊 Current Trading Data</td></tr>
+                <tr><td style="border: 1px solid #dddddd; text-align: left; padding: 8px; font-weight: bold;">Current Market Price (CMP)</td><td style="border: 1px solid #dddddd; text-align: left; padding: 8px; font-weight: bold; font-size: 16px;">{currency_symbol}{current_price:,.2f}</td></tr>
+                <tr><td style="border: 1px solid #dddddd; text-align: left; padding: 8px; font-weight: bold;">Previous Close</td><td style="border: 1px solid #dddddd; text-align: left; padding: 8px;">{currency_symbol}{previous_close:,.2f}</td></tr>
+                <tr><td style="border: 1px solid #dddddd; text-align: left; padding: 8px; font-weight: bold;">Current Day Change</td><td style="border: 1px solid #dddddd; text-align: left; padding: 8px; color: {current_change_color}; font-weight: bold;">{current_change_sign}{currency_symbol}{current_change:,.2f} ({current_change_sign}{current_change_percent:.2f}%)</td></tr>
+                
+                <tr style="background-color: #f2f2f2;"><td colspan="2" style="border: 1px solid #dddddd; text-align: center; padding: 8px; font-weight: bold; font-size: 14px;">📈 Yesterday's Performance</td></tr>
+                <tr><td style="border: 1px solid #dddddd; text-align: left; padding: 8px; font-weight: bold;">Yesterday's Close</td><td style="border: 1px solid #dddddd; text-align: left; padding: 8px;">{currency_symbol}{yesterday_close:,.2f}</td></tr>
+                <tr><td style="border: 1px solid #dddddd; text-align: left; padding: 8px; font-weight: bold;">Yesterday's Change</td><td style="border: 1px solid #dddddd; text-align: left; padding: 8px; color: {yesterday_change_color}; font-weight: bold;">{yesterday_change_sign}{currency_symbol}{yesterday_change:,.2f} ({yesterday_change_sign}{yesterday_change_percent:.2f}%)</td></tr>
+                
+                <tr style="background-color: #f2f2f2;"><td colspan="2" style="border: 1px solid #dddddd; text-align: center; padding: 8px; font-weight: bold; font-size: 14px;">🔒 Security Cover Analysis</td></tr>
+                <tr><td style="border: 1px solid #dddddd; text-align: left; padding: 8px; font-weight: bold;">Required Security Cover</td><td style="border: 1px solid #dddddd; text-align: left; padding: 8px;">{security_cover_threshold:.2f}x</td></tr>
+                <tr><td style="border: 1px solid #dddddd; text-align: left; padding: 8px; font-weight: bold;">Current Security Cover</td><td style="border: 1px solid #dddddd; text-align: left; padding: 8px; {cover_style}">{security_cover:.2f}x</td></tr>
+            </table>
+            """
+
+REPORT_TEMPLATE = """
+        <html>
+            <head>
+                <style>
+                    body {{ font-family: Arial, sans-serif; margin: 20px; }}
+                    table, th, td {{ border: 1px solid #dddddd; }}
+                    td, th {{ text-align: left; padding: 8px; }}
+                    .header {{ background-color: #f2f2f2; font-weight: bold; }}
+                </style>
+            </head>
+            <body>
+                <h2 style="color: #333;">📊 Stock Watchdog Report</h2>
+                <p style="color: #666; font-size: 14px;">Generated on: {generated_at}</p>
+                {body}
+                <hr style="margin-top: 20px;">
+                <p style="font-size: 12px; color: #888;"><em>This is an automated report generated by Stock Watchdog</em></p>
+            </body>
+        </html>
+        """
+
+
 class EmailService:
     def __init__(self, config: SenderConfig):
         self.config = config
+        # A single pooled session is reused by all sends
+        self._pool = SMTPPool(
+            config.smtp_host, config.smtp_port, config.smtp_username, config.smtp_password,
+            use_tls=config.use_tls, size=1
+        )
+        # smtplib is blocking; run it on its own thread so alerts never tie up the default executor
+        self._smtp_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="smtp")
         
         if not self.config.smtp_password:
             logging.warning("SMTP password not configured. Please set it in config.json or SMTP_PASSWORD environment variable.")
     
-    async def send_alert(self, recipient_config: RecipientConfig, subject: str, content: str):
-        if not self.config.smtp_password:
-            logging.error("Cannot send email: SMTP password not configured.")
-            return
-        
-        msg = MIMEMultipart('alternative')
+    def build_message(self, subject: str, content: str) -> EmailMessage:
+        # Body and common headers only; recipient headers are set per send by _address_message
+        msg = EmailMessage()
         msg['Subject'] = subject
         msg['From'] = f"{self.config.from_name} <{self.config.from_email}>"
+        msg.set_content(content, subtype='html')
+        return msg
+    
+    @staticmethod
+    def _address_message(msg: EmailMessage, recipient_config: RecipientConfig):
+        del msg['To']
+        del msg['Cc']
         msg['To'] = recipient_config.email
         
         # Add CC recipients
@@ -254,100 +475,119 @@ class EmailService:
             msg['Cc'] = ', '.join(recipient_config.cc)
         
         # Note: BCC recipients are not added to headers, but included in send_message
+    
+    async def send_alert(self, recipient_config: RecipientConfig, subject: str, content: str):
+        await self.send_batch([(recipient_config, subject, content)])
+    
+    async def send_batch(self, messages: List[Tuple[RecipientConfig, str, str]]):
+        if not self.config.smtp_password:
+            logging.error("Cannot send email: SMTP password not configured.")
+            return
         
-        html_part = MIMEText(content, 'html')
-        msg.attach(html_part)
+        # Recipients sharing a subject and body share one encoded message
+        messages_by_content: Dict[Tuple[str, str], EmailMessage] = {}
+        prepared = []
+        for recipient_config, subject, content in messages:
+            msg = messages_by_content.get((subject, content))
+            if msg is None:
+                msg = messages_by_content[(subject, content)] = self.build_message(subject, content)
+            prepared.append((recipient_config, msg))
         
-        try:
-            await asyncio.to_thread(self._send_smtp_email, msg, recipient_config)
-            recipient_name = recipient_config.name or recipient_config.email
-            logging.info(f"Email sent successfully to {recipient_name}")
-        except Exception as e:
-            logging.error(f"Failed to send email to {recipient_config.email}: {e}")
+        loop = asyncio.get_running_loop()
+        errors = await loop.run_in_executor(self._smtp_executor, self._send_smtp_batch, prepared)
+        
+        for (recipient_config, _), error in zip(prepared, errors):
+            if error is None:
+                recipient_name = recipient_config.name or recipient_config.email
+                logging.info(f"Email sent successfully to {recipient_name}")
+            else:
+                logging.error(f"Failed to send email to {recipient_config.email}: {error}")
     
-    def _send_smtp_email(self, msg: MIMEMultipart, recipient_config: RecipientConfig):
+    async def close(self):
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._smtp_executor, self._pool.close)
+        self._smtp_executor.shutdown()
+    
+    def _send_smtp_batch(self, prepared: List[Tuple[RecipientConfig, EmailMessage]]) -> List[Optional[Exception]]:
+        errors = []
+        for recipient_config, msg in prepared:
+            try:
+                self._send_smtp_email(msg, recipient_config)
+                errors.append(None)
+            except Exception as e:
+                errors.append(e)
+        return errors
+    
+    def _send_smtp_email(self, msg: EmailMessage, recipient_config: RecipientConfig):
         # Build the complete recipient list (TO + CC + BCC)
         all_recipients = [recipient_config.email]
         all_recipients.extend(recipient_config.cc)
         all_recipients.extend(recipient_config.bcc)
         
-        with smtplib.SMTP(self.config.smtp_host, self.config.smtp_port) as server:
-            if self.config.use_tls:
-                server.starttls()
-            server.login(self.config.smtp_username, self.config.smtp_password)
-            server.send_message(msg, to_addrs=all_recipients)
-    
-    def format_grouped_alert(self, all_stock_data: List[Dict], all_stock_configs: List[StockConfig], currency_symbol: str) -> str:
-        email_body_html = ""
+        # Messages are sent one at a time on the SMTP thread, so the shared object can be re-addressed in place
+        self._address_message(msg, recipient_config)
+        
+        # Explicit envelope addresses, so smtplib doesn't re-parse the From/To/Cc headers
+        self._pool.send_message(msg, from_addr=self.config.from_email, to_addrs=all_recipients)
+    
+    def format_stock_section(self, stock_data: Dict, stock_config: StockConfig, currency_symbol: str) -> str:
+        symbol = stock_data.get("symbol")
+        is_cover_breached = stock_data.get("security_cover", 999) < stock_config.security_cover_threshold
+
+        header_text = f"Update for {stock_config.company_name} ({symbol})"
+        header_style = "color: blue;"
+        if is_cover_breached:
+            header_text = f"ATTENTION: {stock_config.company_name} ({symbol})"
+            header_style = "color: red;"
+        
+        current_change_val = stock_data.get("change", 0.0)
+        yesterday_change_val = stock_data.get("yesterday_change", 0.0)
+
+        return STOCK_SECTION_TEMPLATE.format_map({
+            "header_text": header_text,
+            "header_style": header_style,
+            "cover_style": "color: red; font-weight: bold;" if is_cover_breached else "",
+            "currency_symbol": currency_symbol,
+            "current_price": stock_data.get("current_price", 0.0),
+            "previous_close": stock_data.get("previous_close", 0.0),
+            "yesterday_close": stock_data.get("yesterday_close", 0.0),
+            "current_change": current_change_val,
+            "current_change_percent": stock_data.get("change_percent", 0.0),
+            "yesterday_change": yesterday_change_val,
+            "yesterday_change_percent": stock_data.get("yesterday_change_percent", 0.0),
+            "security_cover": stock_data.get("security_cover", 0.0),
+            "security_cover_threshold": stock_config.security_cover_threshold,
+            # Color coding for price changes
+            "current_change_color": "green" if current_change_val >= 0 else "red",
+            "yesterday_change_color": "green" if yesterday_change_val >= 0 else "red",
+            "current_change_sign": "+" if current_change_val >= 0 else "",
+            "yesterday_change_sign": "+" if yesterday_change_val >= 0 else "",
+        })
+    
+    def format_grouped_alert(self, all_stock_data: List[Dict], stock_configs_by_symbol: Dict[str, StockConfig], currency_symbol: str,
+                             section_cache: Optional[Dict[str, str]] = None, generated_at: Optional[str] = None) -> str:
+        # section_cache (symbol -> rendered HTML) lets a broadcast format each stock's numbers once for all recipients
+        if section_cache is None:
+            section_cache = {}
+        if generated_at is None:
+            generated_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S IST')
+        sections = []
         
         for stock_data in all_stock_data:
             symbol = stock_data.get("symbol")
-            stock_config = next((sc for sc in all_stock_configs if sc.symbol == symbol), None)
+            stock_config = stock_configs_by_symbol.get(symbol)
             if not stock_config:
                 continue
 
-            is_cover_breached = stock_data.get("security_cover", 999) < stock_config.security_cover_threshold
+            section = section_cache.get(symbol)
+            if section is None:
+                section = section_cache[symbol] = self.format_stock_section(stock_data, stock_config, currency_symbol)
+            sections.append(section)
 
-            header_text = f"Update for {stock_config.company_name} ({symbol})"
-            header_style = "color: blue;"
-            if is_cover_breached:
-                header_text = f"ATTENTION: {stock_config.company_name} ({symbol})"
-                header_style = "color: red;"
-            
-            cover_style = "color: red; font-weight: bold;" if is_cover_breached else ""
-            
-            current_price_val = stock_data.get("current_price", 0.0)
-            previous_close_val = stock_data.get("previous_close", 0.0)
-            yesterday_close_val = stock_data.get("yesterday_close", 0.0)
-            current_change_val = stock_data.get("change", 0.0)
-            current_change_percent_val = stock_data.get("change_percent", 0.0)
-            yesterday_change_val = stock_data.get("yesterday_change", 0.0)
-            yesterday_change_percent_val = stock_data.get("yesterday_change_percent", 0.0)
-            security_cover_val = stock_data.get("security_cover", 0.0)
-            
-            # Color coding for price changes
-            current_change_color = "green" if current_change_val >= 0 else "red"
-            yesterday_change_color = "green" if yesterday_change_val >= 0 else "red"
-            current_change_sign = "+" if current_change_val >= 0 else ""
-            yesterday_change_sign = "+" if yesterday_change_val >= 0 else ""
-
-            email_body_html += f"""
-            <h3 style="{header_style}">{header_text}</h3>
-            <table style="border-collapse: collapse; width: 100%; font-family: Arial, sans-serif; margin-bottom: 20px;">
-                <tr style="background-color: #f2f2f2;"><td colspan="2" style="border: 1px solid #dddddd; text-align: center; padding: 8px; font-weight: bold; font-size: 14px;">📊 Current Trading Data</td></tr>
-                <tr><td style="border: 1px solid #dddddd; text-align: left; padding: 8px; font-weight: bold;">Current Market Price (CMP)</td><td style="border: 1px solid #dddddd; text-align: left; padding: 8px; font-weight: bold; font-size: 16px;">{currency_symbol}{current_price_val:,.2f}</td></tr>
-                <tr><td style="border: 1px solid #dddddd; text-align: left; padding: 8px; font-weight: bold;">Previous Close</td><td style="border: 1px solid #dddddd; text-align: left; padding: 8px;">{currency_symbol}{previous_close_val:,.2f}</td></tr>
-                <tr><td style="border: 1px solid #dddddd; text-align: left; padding: 8px; font-weight: bold;">Current Day Change</td><td style="border: 1px solid #dddddd; text-align: left; padding: 8px; color: {current_change_color}; font-weight: bold;">{current_change_sign}{currency_symbol}{current_change_val:,.2f} ({current_change_sign}{current_change_percent_val:.2f}%)</td></tr>
-                
-                <tr style="background-color: #f2f2f2;"><td colspan="2" style="border: 1px solid #dddddd; text-align: center; padding: 8px; font-weight: bold; font-size: 14px;">📈 Yesterday's Performance</td></tr>
-                <tr><td style="border: 1px solid #dddddd; text-align: left; padding: 8px; font-weight: bold;">Yesterday's Close</td><td style="border: 1px solid #dddddd; text-align: left; padding: 8px;">{currency_symbol}{yesterday_close_val:,.2f}</td></tr>
-                <tr><td style="border: 1px solid #dddddd; text-align: left; padding: 8px; font-weight: bold;">Yesterday's Change</td><td style="border: 1px solid #dddddd; text-align: left; padding: 8px; color: {yesterday_change_color}; font-weight: bold;">{yesterday_change_sign}{currency_symbol}{yesterday_change_val:,.2f} ({yesterday_change_sign}{yesterday_change_percent_val:.2f}%)</td></tr>
-                
-                <tr style="background-color: #f2f2f2;"><td colspan="2" style="border: 1px solid #dddddd; text-align: center; padding: 8px; font-weight: bold; font-size: 14px;">🔒 Security Cover Analysis</td></tr>
-                <tr><td style="border: 1px solid #dddddd; text-align: left; padding: 8px; font-weight: bold;">Required Security Cover</td><td style="border: 1px solid #dddddd; text-align: left; padding: 8px;">{stock_config.security_cover_threshold:.2f}x</td></tr>
-                <tr><td style="border: 1px solid #dddddd; text-align: left; padding: 8px; font-weight: bold;">Current Security Cover</td><td style="border: 1px solid #dddddd; text-align: left; padding: 8px; {cover_style}">{security_cover_val:.2f}x</td></tr>
-            </table>
-            """
-
-        return f"""
-        <html>
-            <head>
-                <style>
-                    body {{ font-family: Arial, sans-serif; margin: 20px; }}
-                    table, th, td {{ border: 1px solid #dddddd; }}
-                    td, th {{ text-align: left; padding: 8px; }}
-                    .header {{ background-color: #f2f2f2; font-weight: bold; }}
-                </style>
-            </head>
-            <body>
-                <h2 style="color: #333;">📊 Stock Watchdog Report</h2>
-                <p style="color: #666; font-size: 14px;">Generated on: {datetime.now().strftime('%Y-%m-%d %H:%M:%S IST')}</p>
-                {email_body_html}
-                <hr style="margin-top: 20px;">
-                <p style="font-size: 12px; color: #888;"><em>This is an automated report generated by Stock Watchdog</em></p>
-            </body>
-        </html>
-        """
+        return REPORT_TEMPLATE.format(
+            body="".join(sections),
+            generated_at=generated_at,
+        )
 
 
 class StockWatchdog:
@@ -357,9 +597,42 @@ class StockWatchdog:
         self.email_service = EmailService(self.config_manager.get_sender_config())
         self.scheduler = AsyncIOScheduler()
         self.app = FastAPI(title="Stock Price Watchdog")
+        self._apply_config()
         self._setup_routes()
         self._setup_scheduler()
     
+    def _apply_config(self):
+        # Snapshot the parsed config so hot paths don't go back to ConfigManager
+        self._stocks = self.config_manager.get_stocks()
+        self._stock_by_symbol = self.config_manager.get_stocks_by_symbol()
+        # Route handlers match symbols case-insensitively
+        self._stock_by_upper = {stock.symbol.upper(): stock for stock in self._stocks}
+        self._recipients = self.config_manager.get_recipients()
+        self._currency_symbol = self.config_manager.get_currency_symbol()
+        
+        recipients_by_symbol: Dict[str, List[RecipientConfig]] = defaultdict(list)
+        for recipient in self._recipients:
+            for symbol in dict.fromkeys(recipient.subscribed_symbols):
+                recipients_by_symbol[symbol].append(recipient)
+        self._recipients_by_symbol = dict(recipients_by_symbol)
+    
+    async def _refresh_config(self):
+        # A single stat() per tick/request; only re-parse and reschedule when config.json changed
+        if self.config_manager.reload_if_changed():
+            self._apply_config()
+            self._setup_scheduler()
+            await self._refresh_email_service()
+    
+    async def _refresh_email_service(self):
+        sender_config = self.config_manager.get_sender_config()
+        if sender_config == self.email_service.config:
+            return
+        # The SMTP pool is bound to the old host and credentials, so swap in a new service
+        old_service = self.email_service
+        self.email_service = EmailService(sender_config)
+        await old_service.close()
+        logging.info("Email sender settings changed; reconnecting with the new configuration")
+    
     def _setup_routes(self):
         @self.app.get("/")
         async def root():
@@ -368,8 +641,8 @@ class StockWatchdog:
         @self.app.get("/stock/{symbol}")
         async def get_stock_price(symbol: str):
             upper_symbol = symbol.upper()
-            all_stock_configs = self.config_manager.get_stocks()
-            stock_config_obj = next((s for s in all_stock_configs if s.symbol.upper() == upper_symbol), None)
+            await self._refresh_config()
+            stock_config_obj = self._stock_by_upper.get(upper_symbol)
 
             if not stock_config_obj:
                 raise HTTPException(status_code=404, detail=f"Stock {upper_symbol} not found in configuration.")
@@ -382,7 +655,8 @@ class StockWatchdog:
         
         @self.app.get("/stocks")
         async def get_all_monitored_stocks():
-            stocks_config_list = self.config_manager.get_stocks()
+            await self._refresh_config()
+            stocks_config_list = self._stocks
             if not stocks_config_list:
                 return JSONResponse(content={})
             try:
@@ -395,19 +669,19 @@ class StockWatchdog:
         @self.app.post("/alert/{symbol}")
         async def trigger_manual_alert(symbol: str):
             upper_symbol = symbol.upper()
-            all_stocks_config = self.config_manager.get_stocks()
-            stock_config_obj = next((s for s in all_stocks_config if s.symbol.upper() == upper_symbol), None)
+            await self._refresh_config()
+            stock_config_obj = self._stock_by_upper.get(upper_symbol)
 
             if not stock_config_obj:
                 raise HTTPException(status_code=404, detail=f"Stock {upper_symbol} not in watchlist.")
             
             try:
                 stock_data = await self.monitor.get_stock_data(stock_config_obj)
-                currency_symbol = self.config_manager.get_currency_symbol()
+                currency_symbol = self._currency_symbol
                 
                 recipients_to_notify = [
-                    r for r in self.config_manager.get_recipients() 
-                    if upper_symbol in r.subscribed_symbols and r.alert_preferences.get("manual_alerts", True)
+                    r for r in self._recipients_by_symbol.get(upper_symbol, [])
+                    if r.alert_preferences.get("manual_alerts", True)
                 ]
                 if not recipients_to_notify:
                     return {"message": f"Alert for {upper_symbol} processed, but no recipients are subscribed or have manual alerts enabled."}
@@ -416,10 +690,10 @@ class StockWatchdog:
                 subject = "BOT ALERT!" if is_cover_breached else "Manual Stock Update"
                 final_subject = f"{subject}: {stock_config_obj.symbol}"
                 
-                content = self.email_service.format_grouped_alert([stock_data], [stock_config_obj], currency_symbol)
+                content = self.email_service.format_grouped_alert([stock_data], {stock_config_obj.symbol: stock_config_obj}, currency_symbol)
 
-                for recipient in recipients_to_notify:
-                    await self.email_service.send_alert(recipient, final_subject, content)
+                # One shared message and one hop to the SMTP thread for all recipients
+                await self.email_service.send_batch([(recipient, final_subject, content) for recipient in recipients_to_notify])
                 
                 return {"message": f"Alert for {upper_symbol} sent to {len(recipients_to_notify)} recipient(s)."}
             except Exception as e:
@@ -430,22 +704,37 @@ class StockWatchdog:
         schedule_times = self.config_manager.get_schedule_times()
         timezone = self.config_manager.get_timezone()
         
+        # One cron expression per hour ("9:0,30"), so no unintended hour/minute combinations fire
+        minutes_by_hour: Dict[int, List[int]] = defaultdict(list)
         for schedule_time in schedule_times:
             hour, minute = map(int, schedule_time.split(':'))
+            minutes_by_hour[hour].append(minute)
+        triggers = [
+            CronTrigger(hour=hour, minute=",".join(str(minute) for minute in sorted(set(minutes))), timezone=timezone)
+            for hour, minutes in sorted(minutes_by_hour.items())
+        ]
+        
+        if triggers:
+            # All daily reports share a single job; coalesce collapses missed runs into one report
             self.scheduler.add_job(
                 self._scheduled_check,
-                CronTrigger(hour=hour, minute=minute, timezone=timezone),
-                id=f"daily_check_{schedule_time}",
+                triggers[0] if len(triggers) == 1 else OrTrigger(triggers),
+                id="daily_reports",
+                max_instances=1,
+                coalesce=True,
                 replace_existing=True
             )
+        elif self.scheduler.get_job("daily_reports"):
+            self.scheduler.remove_job("daily_reports")
         
-        self.scheduler.add_job(
-            self._continuous_threat_check,
-            'interval',
-            minutes=5,
-            id="threat_monitor",
-            replace_existing=True
-        )
+        # Added once: a fresh interval trigger restarts its countdown, so re-adding on every reload would delay threat checks
+        if self.scheduler.get_job("threat_monitor") is None:
+            self.scheduler.add_job(
+                self._continuous_threat_check,
+                'interval',
+                minutes=5,
+                id="threat_monitor"
+            )
     
     async def _scheduled_check(self):
         await self._check_all_stocks(is_scheduled=True)
@@ -453,17 +742,39 @@ class StockWatchdog:
     async def _continuous_threat_check(self):
         await self._check_all_stocks(is_scheduled=False, threat_only=True)
     
+    def _find_breached_symbols(self, stock_data_map: Dict[str, Dict]) -> set:
+        symbols = [symbol for symbol in stock_data_map if symbol in self._stock_by_symbol]
+        if not symbols:
+            return set()
+        
+        # Compare every stock's cover against its threshold in one vectorized pass
+        covers = np.array([stock_data_map[symbol].get("security_cover", 999) for symbol in symbols], dtype=np.float64)
+        thresholds = np.array([self._stock_by_symbol[symbol].security_cover_threshold for symbol in symbols], dtype=np.float64)
+        breached = covers < thresholds
+        return {symbol for symbol, is_breached in zip(symbols, breached.tolist()) if is_breached}
+    
     async def _check_all_stocks(self, is_scheduled: bool = False, threat_only: bool = False):
-        all_stocks_config = self.config_manager.get_stocks()
-        recipients = self.config_manager.get_recipients()
-        currency_symbol = self.config_manager.get_currency_symbol()
+        await self._refresh_config()
+        all_stocks_config = self._stocks
+        stock_by_symbol = self._stock_by_symbol
+        recipients = self._recipients
+        currency_symbol = self._currency_symbol
 
         if not all_stocks_config or not recipients:
             logging.info("_check_all_stocks: No stocks or recipients configured.")
             return
 
         try:
-            fetched_stock_data_map = await self.monitor.check_multiple_stocks(all_stocks_config)
+            # Threat checks only need prices and security cover, not market cap / P/E / 52-week range
+            fetched_stock_data_map = await self.monitor.fetch_all_cached(all_stocks_config, include_info=not threat_only)
+            # The rendered HTML only depends on the subscribed symbols, so share it across recipients
+            rendered_content: Dict[Tuple[str, ...], str] = {}
+            rendered_sections: Dict[str, str] = {}
+            generated_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S IST')
+            outgoing: List[Tuple[RecipientConfig, str, str]] = []
+            summaries: List[str] = []
+            
+            breached_symbols = self._find_breached_symbols(fetched_stock_data_map)
             
             # Process each recipient individually
             for recipient in recipients:
@@ -475,23 +786,16 @@ class StockWatchdog:
                 if not (should_send_scheduled or should_send_threat):
                     continue
                 
-                # Get stock data for this recipient's subscribed symbols
-                recipient_stock_data = []
-                for symbol in recipient.subscribed_symbols:
-                    if symbol in fetched_stock_data_map:
-                        recipient_stock_data.append(fetched_stock_data_map[symbol])
-                
+                # Stocks are listed in the recipient's own subscription order
+                recipient_stock_data = [
+                    fetched_stock_data_map[symbol] for symbol in recipient.subscribed_symbols
+                    if symbol in fetched_stock_data_map
+                ]
                 if not recipient_stock_data:
                     continue
 
                 # Check if any security cover is breached
-                is_any_cover_breached = False
-                for stock_data in recipient_stock_data:
-                    symbol = stock_data.get("symbol")
-                    stock_config = next((sc for sc in all_stocks_config if sc.symbol == symbol), None)
-                    if stock_config and stock_data.get("security_cover", 999) < stock_config.security_cover_threshold:
-                        is_any_cover_breached = True
-                        break
+                is_any_cover_breached = any(stock_data["symbol"] in breached_symbols for stock_data in recipient_stock_data)
                 
                 # Determine if we should send email
                 should_send_email_now = (should_send_scheduled and not threat_only) or (should_send_threat and is_any_cover_breached)
@@ -501,10 +805,14 @@ class StockWatchdog:
                     if is_scheduled:
                         subject = f"Scheduled Report - {subject}"
                     
-                    email_content = self.email_service.format_grouped_alert(
-                        recipient_stock_data, all_stocks_config, currency_symbol
-                    )
-                    await self.email_service.send_alert(recipient, subject, email_content)
+                    content_key = tuple(stock_data["symbol"] for stock_data in recipient_stock_data)
+                    email_content = rendered_content.get(content_key)
+                    if email_content is None:
+                        email_content = self.email_service.format_grouped_alert(
+                            recipient_stock_data, stock_by_symbol, currency_symbol, rendered_sections, generated_at
+                        )
+                        rendered_content[content_key] = email_content
+                    outgoing.append((recipient, subject, email_content))
                     
                     recipient_name = recipient.name or recipient.email
                     cc_bcc_info = ""
@@ -513,7 +821,13 @@ class StockWatchdog:
                     if recipient.bcc:
                         cc_bcc_info += f" (BCC: {len(recipient.bcc)} recipients)"
                     
-                    logging.info(f"Email sent to {recipient_name} with {len(recipient_stock_data)} stock(s). Alert: {is_any_cover_breached}{cc_bcc_info}")
+                    summaries.append(f"Email sent to {recipient_name} with {len(recipient_stock_data)} stock(s). Alert: {is_any_cover_breached}{cc_bcc_info}")
+            
+            # Deliver everything over a single SMTP session
+            if outgoing:
+                await self.email_service.send_batch(outgoing)
+                for summary in summaries:
+                    logging.info(summary)
 
         except Exception as e:
             logging.error(f"Error in _check_all_stocks: {e}", exc_info=True)
@@ -524,6 +838,7 @@ class StockWatchdog:
     
     async def stop(self):
         self.scheduler.shutdown()
+        await self.email_service.close()
         logging.info("Stock Watchdog stopped")
 
 
@@ -568,4 +883,10 @@ async def main():
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    try:
+        # Installed with uvicorn[standard] on non-Windows platforms
+        import uvloop
+        loop_factory = uvloop.new_event_loop
+    except ImportError:
+        loop_factory = None
+    asyncio.run(main(), loop_factory=loop_factory)
\ No newline at end of file
@@ -0,0 +1,183 @@
+"""
+SMTP connection pool for Stock Watchdog
+Shared by the service's EmailService and the SMTP validation script
+"""
+
+import queue
+import smtplib
+import ssl
+import threading
+import time
+
+SMTPS_PORT = 465
+
+# Built once: loading the system CA bundle is the expensive part of a TLS context
+SSL_CONTEXT = ssl.create_default_context()
+SSL_CONTEXT.minimum_version = ssl.TLSVersion.TLSv1_2
+
+class SMTPPool:
+    """Thread-safe pool of authenticated SMTP sessions.
+
+    Sessions are reused across sends, recycled after max_msgs messages and
+    checked with NOOP before reuse when they have been idle for idle_timeout
+    seconds. Sends that fail with a 4xx reply or a dropped connection are
+    retried up to retries times with exponential backoff; 5xx fails at once.
+    """
+
+    def __init__(self, host, port, username, password, use_tls=True,
+                 size=5, max_msgs=100, idle_timeout=120.0, timeout=30.0, retries=3, debuglevel=0):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.use_tls = use_tls
+        self.max_msgs = max_msgs
+        self.idle_timeout = idle_timeout
+        # Bounds connect and every command, so a dead server can't stall a send indefinitely
+        self.timeout = timeout
+        # Attempts per send; transient (4xx) failures and disconnects are retried with backoff
+        self.retries = retries
+        self.debuglevel = debuglevel
+
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        # id(session) -> messages sent / last release time
+        self._sent = {}
+        self._last_used = {}
+
+    def _open(self):
+        # Port 465 speaks TLS from the first byte, which saves the plaintext
+        # EHLO and STARTTLS round trips of a submission-port (587) handshake
+        implicit_tls = self.use_tls and self.port == SMTPS_PORT
+        if implicit_tls:
+            server = smtplib.SMTP_SSL(self.host, self.port, timeout=self.timeout, context=SSL_CONTEXT)
+        else:
+            server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        try:
+            server.set_debuglevel(self.debuglevel)
+            if self.use_tls and not implicit_tls:
+                server.starttls(context=SSL_CONTEXT)
+            server.login(self.username, self.password)
+        except Exception:
+            server.close()
+            raise
+        self._sent[id(server)] = 0
+        return server
+
+    def _close(self, server):
+        self._sent.pop(id(server), None)
+        self._last_used.pop(id(server), None)
+        try:
+            server.quit()
+        except (smtplib.SMTPException, OSError):
+            server.close()
+
+    def _is_usable(self, server):
+        if time.monotonic() - self._last_used.get(id(server), 0.0) < self.idle_timeout:
+            return True
+        try:
+            return server.noop()[0] == 250
+        except (smtplib.SMTPException, OSError):
+            return False
+
+    def acquire(self):
+        """Return a live session, reusing an idle one when possible"""
+        self._slots.acquire()
+        try:
+            while True:
+                try:
+                    server = self._idle.get_nowait()
+                except queue.Empty:
+                    return self._open()
+                if self._is_usable(server):
+                    return server
+                self._close(server)
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def release(self, server, sent=0):
+        """Return a session to the pool, closing it once it reaches max_msgs"""
+        try:
+            sent += self._sent.get(id(server), 0)
+            if sent >= self.max_msgs:
+                self._close(server)
+            else:
+                self._sent[id(server)] = sent
+                self._last_used[id(server)] = time.monotonic()
+                self._idle.put(server)
+        finally:
+            self._slots.release()
+
+    def discard(self, server):
+        """Close a session that is no longer usable"""
+        try:
+            self._close(server)
+        finally:
+            self._slots.release()
+
+    def ping(self):
+        """NOOP over a pooled session, keeping it warm; reconnects once if it was dropped"""
+        for attempt in range(2):
+            server = self.acquire()
+            try:
+                code = server.noop()[0]
+            except (smtplib.SMTPServerDisconnected, ConnectionError):
+                self.discard(server)
+                if attempt:
+                    raise
+            except BaseException:
+                self.discard(server)
+                raise
+            else:
+                self.release(server)
+                return code == 250
+
+    def send_message(self, msg, from_addr=None, to_addrs=None):
+        """Send an email.message object over a pooled session"""
+        return self._send(lambda server: server.send_message(msg, from_addr=from_addr, to_addrs=to_addrs))
+
+    def sendmail(self, from_addr, to_addrs, msg):
+        """Send an already serialized message over a pooled session"""
+        return self._send(lambda server: server.sendmail(from_addr, to_addrs, msg))
+
+    def _send(self, send):
+        for attempt in range(self.retries):
+            try:
+                return self._send_once(send)
+            except (smtplib.SMTPServerDisconnected, ConnectionError):
+                if attempt == self.retries - 1:
+                    raise
+            except smtplib.SMTPResponseException as e:
+                # Only transient replies are worth another try
+                if not 400 <= e.smtp_code < 500 or attempt == self.retries - 1:
+                    raise
+            time.sleep(2 ** attempt)
+
+    def _send_once(self, send):
+        # acquire() logs in on a fresh session, so a 4xx from AUTH is retried as well
+        server = self.acquire()
+        try:
+            result = send(server)
+        except (smtplib.SMTPRecipientsRefused, smtplib.SMTPResponseException):
+            # The server rejected this message. smtplib has reset the session, or closed
+            # it after a 421, in which case it must not go back to the pool
+            if server.sock is None:
+                self.discard(server)
+            else:
+                self.release(server)
+            raise
+        except BaseException:
+            self.discard(server)
+            raise
+        self.release(server, sent=1)
+        return result
+
+    def close(self):
+        """Close all idle sessions"""
+        while True:
+            try:
+                server = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            self._close(server)
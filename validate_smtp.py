@@ -1,146 +1,335 @@
 #!/usr/bin/env python3
 """
 SMTP Validation Script for Stock Watchdog
-Tests the Hostinger SMTP configuration
+Tests the Hostinger SMTP configuration, once or continuously with --daemon
 """
 
-import asyncio
+import argparse
+import email.policy
 import json
+import logging
 import os
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
+import socket
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime
+from email.message import EmailMessage
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from itertools import batched
+from typing import TypedDict
 from dotenv import load_dotenv
 
-load_dotenv(dotenv_path=".env")
+from smtp_pool import SMTPPool
+
+# The service manager may already provide the password; only then fall back to .env
+if 'SMTP_PASSWORD' not in os.environ and os.path.exists('.env'):
+    load_dotenv(dotenv_path=".env")
+
+logger = logging.getLogger('smtp_validate')
+
+# SMTP protocol trace, off unless SMTP_DEBUG=1 (or 2 for timestamps)
+SMTP_DEBUG = int(os.environ.get('SMTP_DEBUG', '0'))
+
+# Seconds to wait for the TCP probe, then for each SMTP connect/command
+PROBE_TIMEOUT = 3
+SMTP_TIMEOUT = 30
+
+# Envelope recipients per SMTP transaction; larger lists are split into several
+RCPT_BATCH_SIZE = 100
+# Independent SMTP sessions used to send recipient batches in parallel
+MAX_PARALLEL_SESSIONS = 4
+
+# Daemon mode: seconds between connection checks, and the local port serving /healthz
+DAEMON_INTERVAL = 60
+HEALTH_PORT = 8001
+
+TEST_HTML = """
+    <html>
+        <body>
+            <h2>Stock Watchdog SMTP Test</h2>
+            <p>This is a test email to verify that the Hostinger SMTP configuration is working correctly.</p>
+            <p>If you receive this email, the configuration is successful!</p>
+            <hr>
+            <p><em>Stock Watchdog Service</em></p>
+        </body>
+    </html>
+    """
+
+# Plain-text part for clients that don't render HTML
+TEST_TEXT = """Stock Watchdog SMTP Test
+
+This is a test email to verify that the Hostinger SMTP configuration is working correctly.
+If you receive this email, the configuration is successful!
+
+-- 
+Stock Watchdog Service
+"""
+
+class EmailCfg(TypedDict):
+    smtp_host: str
+    smtp_port: int
+    smtp_username: str
+    smtp_password: str
+    from_name: str
+    from_email: str
+    use_tls: bool
+
+def _normalize(email_config) -> EmailCfg:
+    """Fill in the email_sender defaults once, so later reads are plain lookups"""
+    from_email = email_config.get('from_email', '')
+    return EmailCfg(
+        smtp_host=email_config.get('smtp_host', 'smtp.hostinger.com'),
+        smtp_port=email_config.get('smtp_port', 587),
+        smtp_username=email_config.get('smtp_username', from_email),
+        smtp_password=email_config.get('smtp_password', ''),
+        from_name=email_config.get('from_name', 'Stock Watchdog'),
+        from_email=from_email,
+        use_tls=email_config.get('use_tls', True),
+    )
 
 def load_config():
     """Load configuration from config.json"""
     try:
-        with open('config.json', 'r') as f:
-            return json.load(f)
+        # One read of the raw bytes; json detects the UTF encoding itself instead of
+        # going through a locale-dependent text wrapper
+        with open('config.json', 'rb') as f:
+            config = json.loads(f.read())
     except FileNotFoundError:
-        print("ERROR: config.json not found")
+        logger.error("ERROR: config.json not found")
         return None
     except json.JSONDecodeError as e:
-        print(f"ERROR: Invalid JSON in config.json: {e}")
+        logger.error(f"ERROR: Invalid JSON in config.json: {e}")
         return None
+    
+    config['email_sender'] = _normalize(config.get('email_sender', {}))
+    return config
 
-def test_smtp_connection():
-    """Test SMTP connection to Hostinger"""
-    config = load_config()
-    if not config:
-        return False
+@dataclass(frozen=True, slots=True)
+class SMTPConfig:
+    host: str
+    port: int
+    username: str
+    password: str
+    from_name: str
+    from_email: str
+    use_tls: bool = True
+
+def resolve_config(config):
+    """Resolve the normalized email_sender settings and the password"""
+    email_config = config['email_sender']
+    from_email = email_config['from_email']
     
-    email_config = config.get('email_sender', {})
+    if not from_email:
+        logger.error("ERROR: email_sender.from_email not configured in config.json")
+        return None
     
-    # Get password from environment or config
-    password = os.getenv('SMTP_PASSWORD') or email_config.get('smtp_password', '')
+    return SMTPConfig(
+        host=email_config['smtp_host'],
+        port=email_config['smtp_port'],
+        username=email_config['smtp_username'],
+        # Get password from environment or config
+        password=os.getenv('SMTP_PASSWORD') or email_config['smtp_password'],
+        from_name=email_config['from_name'],
+        from_email=from_email,
+        use_tls=email_config['use_tls'],
+    )
+
+def build_pool(smtp_cfg):
+    """Create an SMTP pool from the resolved settings"""
+    return SMTPPool(
+        smtp_cfg.host,
+        smtp_cfg.port,
+        smtp_cfg.username,
+        smtp_cfg.password,
+        use_tls=smtp_cfg.use_tls,
+        size=MAX_PARALLEL_SESSIONS,
+        timeout=SMTP_TIMEOUT,
+        debuglevel=SMTP_DEBUG,
+    )
+
+def build_test_message(smtp_cfg, recipients):
+    """Build the test email once for every configured recipient, with its envelope recipients"""
+    msg = EmailMessage(policy=email.policy.SMTP)
+    msg['Subject'] = "Stock Watchdog SMTP Test"
+    msg['From'] = f"{smtp_cfg.from_name} <{smtp_cfg.from_email}>"
+    # One message goes to everyone, so recipients stay in the envelope only and never see each other's addresses
+    msg['To'] = "undisclosed-recipients:;"
     
-    if not password:
-        print("ERROR: SMTP password not found in environment variable SMTP_PASSWORD or config.json")
-        return False
+    msg.set_content(TEST_TEXT)
+    msg.add_alternative(TEST_HTML, subtype='html')
     
-    smtp_host = email_config.get('smtp_host', 'smtp.hostinger.com')
-    smtp_port = email_config.get('smtp_port', 587)
-    smtp_username = email_config.get('smtp_username', email_config.get('from_email', ''))
+    # To + Cc + Bcc of all recipients go out as RCPTs of one DATA upload per batch
+    to_addrs = [r['email'] for r in recipients]
+    to_addrs += [addr for r in recipients for addr in r.get('cc', []) + r.get('bcc', [])]
+    return msg, list(dict.fromkeys(to_addrs))
+
+def validate(pool, smtp_cfg, recipients) -> tuple[bool, bool]:
+    """Test the SMTP connection, then send the test email over the same pooled session"""
+    # Test 1: SMTP Connection
+    logger.info("\n1. Testing SMTP Connection...")
+    if not smtp_cfg.password:
+        logger.error("ERROR: SMTP password not found in environment variable SMTP_PASSWORD or config.json")
+        return False, False
     
-    print(f"Testing SMTP connection to {smtp_host}:{smtp_port}")
-    print(f"Username: {smtp_username}")
+    logger.info(f"Testing SMTP connection to {smtp_cfg.host}:{smtp_cfg.port}")
+    logger.info(f"Username: {smtp_cfg.username}")
     
+    # Plain TCP probe first, so an unreachable host fails in seconds rather than after the OS connect timeout
     try:
-        with smtplib.SMTP(smtp_host, smtp_port) as server:
-            server.set_debuglevel(1)  # Enable debug output
-            server.starttls()
-            server.login(smtp_username, password)
-            print("✅ SMTP connection successful!")
-            return True
-    except Exception as e:
-        print(f"❌ SMTP connection failed: {e}")
-        return False
-
-def test_send_email():
-    """Test sending a simple email"""
-    config = load_config()
-    if not config:
-        return False
+        with socket.create_connection((smtp_cfg.host, smtp_cfg.port), timeout=PROBE_TIMEOUT):
+            pass
+    except OSError as e:
+        logger.error(f"❌ Cannot reach {smtp_cfg.host}:{smtp_cfg.port}: {e}")
+        return False, False
     
-    email_config = config.get('email_sender', {})
-    recipients = config.get('recipients', [])
+    try:
+        # The authenticated session stays in the pool for the send below
+        pool.release(pool.acquire())
+        logger.info("✅ SMTP connection successful!")
+    except Exception as e:
+        logger.error(f"❌ SMTP connection failed: {e}")
+        return False, False
     
+    # Test 2: Send Test Email over the same session
+    logger.info("\n2. Testing Email Sending...")
     if not recipients:
-        print("ERROR: No recipients configured")
+        logger.error("ERROR: No recipients configured")
+        return True, False
+    
+    msg, to_addrs = build_test_message(smtp_cfg, recipients)
+    # Serialize once; every batch sends the same bytes
+    raw = msg.as_bytes()
+    
+    batches = [list(batch) for batch in batched(to_addrs, RCPT_BATCH_SIZE)]
+    
+    try:
+        # Each worker takes its own pooled session; the first reuses the one opened above
+        with ThreadPoolExecutor(max_workers=min(len(batches), MAX_PARALLEL_SESSIONS)) as executor:
+            list(executor.map(lambda batch: pool.sendmail(smtp_cfg.from_email, batch, raw), batches))
+        logger.info(f"✅ Test email sent successfully to {len(to_addrs)} recipient(s): {', '.join(to_addrs)}")
+        return True, True
+    except Exception as e:
+        logger.error(f"❌ Failed to send test email: {e}")
+        return True, False
+
+def validate_once(pool, smtp_cfg, recipients):
+    """Run both tests and report the overall result"""
+    connection_ok, email_ok = validate(pool, smtp_cfg, recipients)
+    
+    if not connection_ok:
+        logger.error("\n❌ SMTP connection failed. Please check your configuration.")
         return False
     
-    password = os.getenv('SMTP_PASSWORD') or email_config.get('smtp_password', '')
-    if not password:
-        print("ERROR: SMTP password not configured")
+    if email_ok:
+        logger.info("\n✅ All tests passed! Your Hostinger SMTP configuration is working correctly.")
+        return True
+    else:
+        logger.error("\n❌ Email sending failed. Check the error messages above.")
         return False
+
+class HealthHandler(BaseHTTPRequestHandler):
+    """Serves the result of the daemon's latest connection check on /healthz"""
     
-    # Create test email
-    msg = MIMEMultipart('alternative')
-    msg['Subject'] = "Stock Watchdog SMTP Test"
-    msg['From'] = f"{email_config.get('from_name', 'Stock Watchdog')} <{email_config.get('from_email', '')}>"
-    msg['To'] = recipients[0]['email']
+    def do_GET(self):
+        if self.path != '/healthz':
+            self.send_error(404)
+            return
+        
+        health = self.server.health
+        body = json.dumps(health).encode()
+        self.send_response(200 if health['ok'] else 503)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
     
-    html_content = """
-    <html>
-        <body>
-            <h2>Stock Watchdog SMTP Test</h2>
-            <p>This is a test email to verify that the Hostinger SMTP configuration is working correctly.</p>
-            <p>If you receive this email, the configuration is successful!</p>
-            <hr>
-            <p><em>Stock Watchdog Service</em></p>
-        </body>
-    </html>
-    """
+    def log_message(self, format, *args):
+        logger.debug(format, *args)
+
+def run_daemon(pool, smtp_cfg, interval, port):
+    """Keep a pooled session warm with NOOP every interval seconds and publish its state on /healthz"""
+    if not smtp_cfg.password:
+        logger.error("ERROR: SMTP password not found in environment variable SMTP_PASSWORD or config.json")
+        return False
     
-    html_part = MIMEText(html_content, 'html')
-    msg.attach(html_part)
+    server = ThreadingHTTPServer(('127.0.0.1', port), HealthHandler)
+    server.health = {'ok': False, 'checked_at': None, 'error': 'not checked yet'}
+    threading.Thread(target=server.serve_forever, name='healthz', daemon=True).start()
+    logger.info(f"Checking {smtp_cfg.host}:{smtp_cfg.port} every {interval}s; health on http://127.0.0.1:{port}/healthz")
     
+    was_ok = None
     try:
-        with smtplib.SMTP(email_config.get('smtp_host', 'smtp.hostinger.com'), 
-                         email_config.get('smtp_port', 587)) as server:
-            server.starttls()
-            server.login(email_config.get('smtp_username', email_config.get('from_email', '')), password)
-            server.send_message(msg)
-            print(f"✅ Test email sent successfully to {recipients[0]['email']}")
-            return True
-    except Exception as e:
-        print(f"❌ Failed to send test email: {e}")
-        return False
+        while True:
+            # Connection check only: a test email every tick would flood the recipients
+            try:
+                ok = pool.ping()
+                error = None if ok else "NOOP rejected"
+            except Exception as e:
+                ok, error = False, str(e)
+            
+            server.health = {
+                'ok': ok,
+                'checked_at': datetime.now().isoformat(timespec='seconds'),
+                'error': error,
+            }
+            # Log state changes only, so a healthy daemon stays quiet
+            if ok != was_ok:
+                if ok:
+                    logger.info("✅ SMTP connection healthy")
+                else:
+                    logger.error(f"❌ SMTP connection check failed: {error}")
+                was_ok = ok
+            
+            time.sleep(interval)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Validate the Stock Watchdog SMTP configuration")
+    parser.add_argument('--daemon', action='store_true',
+                        help="keep running, checking the connection periodically and serving /healthz")
+    parser.add_argument('--interval', type=int, default=DAEMON_INTERVAL,
+                        help=f"seconds between checks in daemon mode (default: {DAEMON_INTERVAL})")
+    parser.add_argument('--port', type=int, default=HEALTH_PORT,
+                        help=f"local port for the /healthz endpoint (default: {HEALTH_PORT})")
+    return parser.parse_args(argv)
 
-def main():
+def main(argv=None):
     """Main validation function"""
-    print("Stock Watchdog SMTP Validation")
-    print("=" * 40)
+    args = parse_args(argv)
     
-    # Test 1: SMTP Connection
-    print("\n1. Testing SMTP Connection...")
-    connection_ok = test_smtp_connection()
+    logger.info("Stock Watchdog SMTP Validation")
+    logger.info("=" * 40)
     
-    if not connection_ok:
-        print("\n❌ SMTP connection failed. Please check your configuration.")
+    config = load_config()
+    if not config:
         return False
     
-    # Test 2: Send Test Email
-    print("\n2. Testing Email Sending...")
-    email_ok = test_send_email()
-    
-    if email_ok:
-        print("\n✅ All tests passed! Your Hostinger SMTP configuration is working correctly.")
-        return True
-    else:
-        print("\n❌ Email sending failed. Check the error messages above.")
+    smtp_cfg = resolve_config(config)
+    if not smtp_cfg:
         return False
+    
+    # One pool for the whole process, so daemon checks reuse the authenticated session
+    pool = build_pool(smtp_cfg)
+    try:
+        if args.daemon:
+            return run_daemon(pool, smtp_cfg, args.interval, args.port)
+        return validate_once(pool, smtp_cfg, config.get('recipients', []))
+    finally:
+        pool.close()
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(message)s', stream=sys.stderr)
     try:
         success = main()
         exit(0 if success else 1)
     except KeyboardInterrupt:
-        print("\n\nValidation interrupted by user")
+        logger.error("\n\nValidation interrupted by user")
         exit(1)
     except Exception as e:
-        print(f"\nValidation crashed: {e}")
+        logger.error(f"\nValidation crashed: {e}")
         exit(1) 
\ No newline at end of file